@@ -5,6 +5,15 @@ from dotenv import load_dotenv
 from colorama import init, Fore, Back, Style
 import difflib
 import asyncio
+import re
+import copy
+import threading
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
 from duckduckgo_search import AsyncDDGS
 import json
 from pygments import highlight
@@ -41,6 +50,32 @@ EDITOR_MODEL = "anthropic/claude-3.5-sonnet"
 # "anthropic/claude-3-haiku"
 # "mistralai/mistral-large"
 
+# Providers that honour explicit cache_control markers on OpenRouter.
+# Others (OpenAI, DeepSeek) cache stable prefixes automatically.
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+# Added files are watched for changes; edits settle for this long before being diffed
+WATCH_DEBOUNCE_SECONDS = 0.5
+WATCH_POLL_INTERVAL = 1.0  # Used when inotify isn't available
+INOTIFY_MASK = 0x2 | 0x8 | 0x80 | 0x100 | 0x200  # MODIFY, CLOSE_WRITE, MOVED_TO, CREATE, DELETE
+PINNED_FILE_PATTERN = r'The following file has been added: (.+?):\n\n(.*?)\n\n(?=The following file has been added: |\Z)'
+IGNORED_FILE_SUFFIXES = ("~", ".bak", ".swp", ".swo", ".swx", ".tmp", ".temp", ".orig", ".rej", ".part")
+
+# Edit routing: small, simple single-file edits skip the planner
+FAST_EDIT_MAX_LINES = 150
+FAST_EDIT_MAX_WORDS = 30
+COMPLEX_EDIT_KEYWORDS = ("refactor", "restructure", "redesign", "rewrite", "architecture", "migrate", "across", "every", "all files")
+COMPLEX_EDIT_PATTERN = r'\b(?:' + '|'.join(re.escape(k) for k in COMPLEX_EDIT_KEYWORDS) + r')\b'
+FAST_EDIT_CONTEXT_TURNS = 6  # Recent chat turns the editor sees on the fast route
+
+# Files longer than this are edited chunk by chunk, in parallel
+LARGE_FILE_LINE_THRESHOLD = 400
+CHUNK_TARGET_LINES = 150
+PLAN_ITEM_PATTERN = r'\s*(?:[-*]\s*)?\**\d+[.)]'
+LINE_RANGE_PATTERN = r'(\d+)(?:\s*(?:-|–|to)\s*(\d+))?'
+# "line 5", "lines 10-12", "lines 10, 12 and 15"
+LINE_REF_PATTERN = r'\blines?\s+(\d+(?:\s*(?:-|–|to)\s*\d+)?(?:\s*(?:,\s*and|,|and|&)\s*\d+(?:\s*(?:-|–|to)\s*\d+)?)*)\b'
+
 SYSTEM_PROMPT = """You are an incredible developer assistant. You have the following traits:
 - You write clean, efficient code
 - You explain concepts with clarity
@@ -70,6 +105,16 @@ ULTRA IMPORTANT:
 
 added_files = []
 stored_searches = {}
+pinned_context = []  # File, search and image messages kept ahead of the chat turns
+session_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+usage_lock = threading.Lock()
+file_snapshots = {}  # Absolute path -> content the model last saw
+pinned_files = {}  # Absolute path -> that file's message in pinned_context
+indexed_dirs = set()
+dirty_files = {}  # Absolute path -> time of last change seen
+pending_file_updates = []
+watch_lock = threading.Lock()
+watcher_thread = None
 file_templates = {
     "python": "def main():\n    pass\n\nif __name__ == \"__main__\":\n    main()",
     "html": "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n    <meta charset=\"UTF-8\">\n    <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n    <title>Document</title>\n</head>\n<body>\n    \n</body>\n</html>",
@@ -78,7 +123,8 @@ file_templates = {
 undo_history = {}
 stored_images = {}
 command_history = FileHistory('.aiconsole_history.txt')
-commands = WordCompleter(['/add', '/edit', '/new', '/search', '/image', '/clear', '/reset', '/diff', '/history', '/save', '/load', '/undo', '/help', '/model', '/change_model', '/show', 'exit'], ignore_case=True)
+app_written_files = {os.path.abspath(command_history.filename)}  # Never picked up from indexed folders
+commands = WordCompleter(['/add', '/edit', '/new', '/search', '/image', '/clear', '/reset', '/diff', '/history', '/save', '/load', '/undo', '/help', '/model', '/change_model', '/show', '/usage', 'exit'], ignore_case=True)
 session = PromptSession(history=command_history)
 
 async def get_input_async(message):
@@ -156,7 +202,7 @@ async def handle_image_command(filepaths_or_urls, default_chat_history):
                         "source": "url",
                         "content": image_path
                     }
-                    default_chat_history.append({
+                    pinned_context.append({
                         "role": "user",
                         "content": [{"type": "image_url", "image_url": {"url": image_path}}]
                     })
@@ -182,7 +228,7 @@ async def handle_image_command(filepaths_or_urls, default_chat_history):
                                 "source": "local",
                                 "content": data_uri
                             }
-                            default_chat_history.append({
+                            pinned_context.append({
                                 "role": "user",
                                 "content": [{
                                     "type": "image_url",
@@ -215,18 +261,70 @@ def clear_console():
 def print_colored(text, color=Fore.WHITE, style=Style.NORMAL, end='\n'):
     print(f"{style}{color}{text}{Style.RESET_ALL}", end=end)
 
-def get_streaming_response(messages, model):
+def supports_cache_control(model):
+    return model.startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+def with_cache_marker(message):
+    """Return a copy of the message with an ephemeral cache breakpoint on its last part."""
+    marked = copy.deepcopy(message)
+    if isinstance(marked["content"], str):
+        marked["content"] = [{"type": "text", "text": marked["content"]}]
+    if marked["content"]:
+        marked["content"][-1]["cache_control"] = {"type": "ephemeral"}
+    return marked
+
+def build_messages(chat_history, model, include_pinned=True):
+    """Arrange system prompt, pinned context and chat turns into a cache-friendly request."""
+    system = [m for m in chat_history if m["role"] == "system"]
+    turns = [m for m in chat_history if m["role"] != "system"]
+    pinned = list(pinned_context) if include_pinned else []
+
+    if supports_cache_control(model):
+        # Breakpoints after the system prompt, the pinned context and the last turn before
+        # the new request; all three only ever grow
+        if system:
+            system[-1] = with_cache_marker(system[-1])
+        if pinned:
+            pinned[-1] = with_cache_marker(pinned[-1])
+        if len(turns) > 1:
+            turns[-2] = with_cache_marker(turns[-2])
+
+    return system + pinned + turns
+
+def record_usage(usage):
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details else 0
+    with usage_lock:
+        session_usage["requests"] += 1
+        session_usage["prompt_tokens"] += usage.prompt_tokens or 0
+        session_usage["cached_tokens"] += cached or 0
+        session_usage["completion_tokens"] += usage.completion_tokens or 0
+
+def get_streaming_response(messages, model, on_line=None):
     try:
         stream = client.chat.completions.create(
             model=model,
-            messages=messages,
+            messages=build_messages(messages, model),
             stream=True,
+            extra_body={"usage": {"include": True}},
         )
         full_response = ""
+        line_buffer = ""
         for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
             if chunk.choices[0].delta.content is not None:
                 print_colored(chunk.choices[0].delta.content, end="")
                 full_response += chunk.choices[0].delta.content
+                if on_line:
+                    line_buffer += chunk.choices[0].delta.content
+                    while '\n' in line_buffer:
+                        line, line_buffer = line_buffer.split('\n', 1)
+                        on_line(line)
         return full_response.strip()
     except Exception as e:
         print_colored(f"Error in streaming response: {e}", Fore.RED)
@@ -238,6 +336,8 @@ def read_file_content(filepath):
             return file.read()
     except FileNotFoundError:
         return f"❌ Error: File not found: {filepath}"
+    except UnicodeDecodeError:
+        return f"❌ Error reading {filepath}: not valid UTF-8"
     except IOError as e:
         return f"❌ Error reading {filepath}: {e}"
 
@@ -269,43 +369,686 @@ def is_text_file(file_path, sample_size=8192, text_characters=set(bytes(range(32
         return False
 
 async def handle_add_command(chat_history, *paths):
-    global added_files
     contents = []
-    new_context = ""
 
     for path in paths:
         if os.path.isfile(path):  # File handling
             content = read_file_content(path)
             if not content.startswith("❌"):
                 contents.append((path, content))
-                added_files.append(path)
 
         elif os.path.isdir(path):  # Directory handling
             print_colored(f"📁 Processing folder: {path}", Fore.CYAN)
+            track_directory(path)
             for item in os.listdir(path):
                 item_path = os.path.join(path, item)
-                if os.path.isfile(item_path) and is_text_file(item_path):
+                if os.path.isfile(item_path) and not is_ignored_file(item_path) and is_text_file(item_path):
                     content = read_file_content(item_path)
                     if not content.startswith("❌"):
                         contents.append((item_path, content))
-                        added_files.append(item_path)
 
         else:
             print_colored(f"❌ '{path}' is neither a valid file nor folder.", Fore.RED)
 
     if contents:
         for fp, content in contents:
-            new_context += f"""The following file has been added: {fp}:
+            new_context = f"""The following file has been added: {fp}:
 \n{content}\n\n"""
+            key = os.path.abspath(fp)
+            if key in pinned_files:
+                # Re-adding rebuilds the pinned snapshot; changes since were sent as diffs in the chat
+                pinned_files[key]["content"] = new_context
+            else:
+                pinned_files[key] = {"role": "user", "content": new_context}
+                pinned_context.append(pinned_files[key])
+            track_file(fp, content)
 
-        chat_history.append({"role": "user", "content": new_context})
         print_colored(f"✅ Added {len(contents)} files to knowledge!", Fore.GREEN)
     else:
         print_colored("❌ No valid files were added to knowledge.", Fore.YELLOW)
 
     return chat_history
 
+def is_ignored_file(path):
+    """Skip hidden, backup and temp files, and files the app writes itself."""
+    name = os.path.basename(path)
+    return (
+        name.startswith(('.', '#'))
+        or name.endswith(IGNORED_FILE_SUFFIXES)
+        or os.path.abspath(path) in app_written_files
+    )
+
+def track_file(path, content):
+    key = os.path.abspath(path)
+    with watch_lock:
+        if key not in file_snapshots and path not in added_files:
+            added_files.append(path)
+        file_snapshots[key] = content
+    start_file_watcher()
+
+def track_directory(path):
+    with watch_lock:
+        indexed_dirs.add(os.path.abspath(path))
+    start_file_watcher()
+
+def restore_file_tracking(paths, directories):
+    """Rebuild pinned_files and the watched snapshots after a session is loaded."""
+    for message in pinned_context:
+        if not isinstance(message["content"], str):
+            continue
+        pinned = re.findall(PINNED_FILE_PATTERN, message["content"], re.DOTALL)
+        for path, content in pinned:
+            if len(pinned) == 1:
+                with watch_lock:
+                    pinned_files[os.path.abspath(path)] = message
+            track_file(path, content)
+            mark_dirty(path)  # Diff what the model saw against the disk before the next request
+
+    # Files that only reached the chat through refreshes are watched from their current content
+    for path in paths:
+        if os.path.abspath(path) not in file_snapshots and os.path.isfile(path):
+            content = read_file_content(path)
+            if not content.startswith("❌"):
+                track_file(path, content)
+    for directory in directories:
+        if os.path.isdir(directory):
+            track_directory(directory)
+
+def clear_file_watches():
+    with watch_lock:
+        file_snapshots.clear()
+        pinned_files.clear()
+        indexed_dirs.clear()
+        dirty_files.clear()
+        pending_file_updates.clear()
+
+def watched_paths():
+    with watch_lock:
+        paths = set(file_snapshots)
+        dirs = set(indexed_dirs)
+    for directory in dirs:
+        try:
+            paths.update(os.path.join(directory, item) for item in os.listdir(directory))
+        except OSError:
+            continue
+    return paths
+
+def mark_dirty(path):
+    path = os.path.abspath(path)
+    with watch_lock:
+        if path in app_written_files:
+            return
+        if path in file_snapshots or (os.path.dirname(path) in indexed_dirs and not is_ignored_file(path)):
+            dirty_files[path] = time.monotonic()
+
+def collect_file_updates(force=False):
+    """Turn settled changes into compact diffs against the content the model last saw."""
+    now = time.monotonic()
+    with watch_lock:
+        settled = [p for p, t in dirty_files.items() if force or now - t >= WATCH_DEBOUNCE_SECONDS]
+        for path in settled:
+            del dirty_files[path]
+
+    updates = []
+    for path in settled:
+        display_path = os.path.relpath(path)
+        with watch_lock:
+            old_content = file_snapshots.get(path)
+
+        if not os.path.exists(path):
+            if old_content is not None:
+                with watch_lock:
+                    file_snapshots.pop(path, None)
+                    # Drop the deleted file's text from every later request
+                    pinned_message = pinned_files.pop(path, None)
+                    pinned_context[:] = [m for m in pinned_context if m is not pinned_message]
+                    added_files[:] = [fp for fp in added_files if os.path.abspath(fp) != path]
+                updates.append(f"File deleted: {display_path}")
+            continue
+
+        if not os.path.isfile(path) or (old_content is None and not is_text_file(path)):
+            continue
+
+        new_content = read_file_content(path)
+        if new_content.startswith("❌") or new_content == old_content:
+            continue
+
+        with watch_lock:
+            file_snapshots[path] = new_content
+            if old_content is None:
+                added_files.append(display_path)
+
+        if old_content is None:
+            updates.append(f"The following file has been added: {display_path}:\n\n{new_content}")
+        else:
+            diff = difflib.unified_diff(
+                old_content.splitlines(), new_content.splitlines(),
+                fromfile=display_path, tofile=display_path, lineterm='', n=2
+            )
+            updates.append('\n'.join(diff))
+
+    return updates
+
+def queue_file_updates():
+    updates = collect_file_updates()
+    if updates:
+        with watch_lock:
+            pending_file_updates.extend(updates)
+
+def flush_file_updates(chat_history):
+    """Add queued file changes as a chat turn just before the next request."""
+    updates = collect_file_updates(force=True)
+    with watch_lock:
+        updates = pending_file_updates + updates
+        pending_file_updates.clear()
+
+    if updates:
+        chat_history.append({
+            "role": "user",
+            "content": "The following files changed on disk since they were added:\n\n" + "\n\n".join(updates)
+        })
+        print_colored(f"🔄 Refreshed {len(updates)} changed file(s) in context.", Fore.CYAN)
+
+def open_inotify():
+    """Return (libc, fd) for an inotify instance, or None where it isn't available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+    except (OSError, AttributeError):
+        return None
+    return (libc, fd) if fd >= 0 else None
+
+def inotify_watch_step(libc, fd, watches):
+    # Watch parent directories so editors that save by rename are still seen
+    with watch_lock:
+        directories = {os.path.dirname(p) for p in file_snapshots} | indexed_dirs
+    for directory in directories - set(watches.values()):
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), INOTIFY_MASK)
+        if wd >= 0:
+            watches[wd] = directory
+
+    ready, _, _ = select.select([fd], [], [], WATCH_DEBOUNCE_SECONDS)
+    if ready:
+        data = os.read(fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            offset += 16 + length
+            if wd in watches and name:
+                mark_dirty(os.path.join(watches[wd], os.fsdecode(name)))
+
+    queue_file_updates()
+
+def polling_watch_step(mtimes, first_pass):
+    for path in watched_paths():
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if (path in mtimes and mtimes[path] != mtime) or (path not in mtimes and not first_pass):
+            mark_dirty(path)
+        mtimes[path] = mtime
+
+    queue_file_updates()
+
+def run_inotify_watcher(libc, fd):
+    watches = {}  # wd -> directory
+    while True:
+        try:
+            inotify_watch_step(libc, fd, watches)
+        except Exception as e:
+            # One bad file must not stop the watcher for the rest of the session
+            print_colored(f"⚠️ File watcher error: {e}", Fore.YELLOW)
+            time.sleep(WATCH_POLL_INTERVAL)
+
+def run_polling_watcher():
+    mtimes = {}
+    first_pass = True
+    while True:
+        try:
+            polling_watch_step(mtimes, first_pass)
+            first_pass = False
+        except Exception as e:
+            print_colored(f"⚠️ File watcher error: {e}", Fore.YELLOW)
+        time.sleep(WATCH_POLL_INTERVAL)
+
+def start_file_watcher():
+    global watcher_thread
+    if watcher_thread is not None:
+        return
+
+    inotify = open_inotify()
+    if inotify:
+        watcher_thread = threading.Thread(target=run_inotify_watcher, args=inotify, daemon=True)
+    else:
+        watcher_thread = threading.Thread(target=run_polling_watcher, daemon=True)
+    watcher_thread.start()
+
+def split_into_chunks(lines, target_size=CHUNK_TARGET_LINES):
+    """Split lines into (start, end) ranges at top-level boundaries."""
+    chunks = []
+    start = 0
+    for i in range(1, len(lines)):
+        size = i - start
+        prev_blank = not lines[i - 1].strip()
+        top_level = lines[i].strip() and not lines[i][0].isspace()
+        # Prefer a blank line followed by unindented code; settle for any blank line if the chunk runs long,
+        # and cut anywhere rather than let one chunk outgrow the editor's output limit
+        if (
+            (size >= target_size and prev_blank and top_level)
+            or (size >= target_size * 2 and prev_blank)
+            or size >= target_size * 3
+        ):
+            chunks.append((start, i))
+            start = i
+    chunks.append((start, len(lines)))
+    return chunks
+
+def mentioned_files(text, filepaths):
+    """Files named in the text as a whole path or file name, in the order they appear."""
+    positions = {}
+    for fp in filepaths:
+        for name in (fp, os.path.basename(fp)):
+            match = re.search(r'(?<![\w.\-/])' + re.escape(name) + r'(?![\w\-/])', text)
+            if match:
+                positions[fp] = min(positions.get(fp, match.start()), match.start())
+    return sorted(positions, key=positions.get)
+
+def plan_heading_file(line, filepaths):
+    """The file a plan heading line starts a section for, or None if the line isn't a heading."""
+    if line.startswith((' ', '\t')) or re.match(PLAN_ITEM_PATTERN, line):
+        return None
+    mentioned = mentioned_files(line, filepaths)
+    text = line.strip()
+    # Markdown headings, or short labels like "File: a.py" and "**a.py**"
+    if len(mentioned) == 1 and (text.startswith('#') or len(text.split()) <= 4):
+        return mentioned[0]
+    return None
+
+def split_plan_by_file(instructions, filepaths):
+    """Group the planner's numbered instructions by the file each one applies to."""
+    plan = {fp: [] for fp in filepaths}
+    section_file = filepaths[0] if len(filepaths) == 1 else None
+    last_item_file = None
+    item = None
+    in_fence = False
+
+    for line in instructions.split('\n'):
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+            if item is not None:
+                item.append(line)
+            continue
+
+        heading_file = None if in_fence else plan_heading_file(line, filepaths)
+        if heading_file:
+            section_file = heading_file
+            item = None
+        elif not in_fence and re.match(PLAN_ITEM_PATTERN, line):
+            # An item belongs to its section; without headings, to the first file it names
+            mentioned = mentioned_files(line, filepaths)
+            owner = section_file or (mentioned[0] if mentioned else last_item_file)
+            item = [line]
+            if owner:
+                plan[owner].append(item)
+                last_item_file = owner
+        elif item is not None:
+            item.append(line)
+
+    return {fp: ['\n'.join(item).rstrip() for item in items] for fp, items in plan.items()}
+
+def instruction_line_refs(instruction):
+    refs = set()
+    for match in re.finditer(LINE_REF_PATTERN, instruction, re.IGNORECASE):
+        for first, last in re.findall(LINE_RANGE_PATTERN, match.group(1)):
+            refs.update(range(int(first), int(last or first) + 1))
+    return refs
+
+def unnumbered_instructions(instructions, filepath, filepaths):
+    return [item for item in split_plan_by_file(instructions, filepaths)[filepath] if not instruction_line_refs(item)]
+
+def ensure_line_numbered_plan(default_chat_history, instructions, large_files, filepaths):
+    """Re-plan once if a large file has no instructions, or one that doesn't say which lines it changes."""
+    plan = split_plan_by_file(instructions, filepaths)
+    missing = [fp for fp in large_files if not plan[fp] or unnumbered_instructions(instructions, fp, filepaths)]
+    if not missing:
+        return instructions
+
+    print_colored(f"\n🔁 Instructions for {', '.join(missing)} are missing line numbers, re-planning...", Fore.YELLOW)
+    default_chat_history.append({
+        "role": "user",
+        "content": f"Some instructions for {', '.join(missing)} are missing or don't say which lines they change. Restate ALL edit instructions for ALL files, numbered and grouped under a heading naming each file. Every instruction for {', '.join(missing)} must give the original line numbers it changes as 'line N' or 'lines N-M' (use line 1 for additions at the top of the file)."
+    })
+    replanned = get_streaming_response(default_chat_history, DEFAULT_MODEL)
+    default_chat_history.append({"role": "assistant", "content": replanned})
+    return replanned or instructions
+
+def strip_code_fences(text):
+    lines = text.split('\n')
+    if lines and lines[0].strip().startswith("```"):
+        lines = lines[1:]
+    if lines and lines[-1].strip() == "```":
+        lines = lines[:-1]
+    return lines
+
+def blank_edges(lines):
+    """Return the (start, end) range of lines left after trimming leading and trailing blank lines."""
+    start, end = 0, len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return start, end
+
+def indentation(line):
+    return len(line) - len(line.lstrip())
+
+def fit_chunk_edit(edited, original, prev_line, next_line, changed_line_count):
+    """Check an edited chunk and fit it between its neighbours. Returns (lines, problem).
+
+    changed_line_count is how many of the chunk's lines its instructions refer to; only those
+    may disappear, so a shorter output than that allows means the editor dropped code.
+    """
+    if edited and all(re.match(r'\d+: ', line) for line in edited if line.strip()):
+        edited = [re.sub(r'^\d+: ', '', line) for line in edited]  # Editor echoed the line numbers
+
+    o_start, o_end = blank_edges(original)
+    e_start, e_end = blank_edges(edited)
+    core, original_core = edited[e_start:e_end], original[o_start:o_end]
+
+    if not core:
+        return None, "editor returned no code"
+    if original_core:
+        if indentation(core[0]) != indentation(original_core[0]):
+            return None, "indentation changed at the start of the chunk"
+        if len(core) < len(original_core) - changed_line_count:
+            return None, f"output looks truncated ({len(core)} of {len(original_core)} lines, {changed_line_count} changed)"
+        if prev_line is not None and core[0] == prev_line and original_core[0] != prev_line:
+            return None, "editor repeated code from the previous chunk"
+        if next_line is not None and core[-1] == next_line and original_core[-1] != next_line:
+            return None, "editor repeated code from the next chunk"
+
+    # Editors drop the blank lines around a chunk, so keep the original ones at each seam
+    return original[:o_start] + core + original[o_end:], None
+
+def edit_chunk(filepath, lines, start, end, instructions, file_plan):
+    # The file's plan is identical across its parallel chunk calls, so it goes first as a cacheable prefix
+    shared_message = (
+        f"You are editing {filepath} one chunk at a time. The full plan for this file is below for context. "
+        "Each request names the instructions for its chunk; never apply an instruction outside the lines it names.\n\n"
+        f"{file_plan}"
+    )
+    numbered = '\n'.join(f"{n}: {line}" for n, line in enumerate(lines[start:end], start + 1))
+    edit_message = (
+        f"Instructions for lines {start + 1}-{end} of {filepath}:\n{instructions}\n\n"
+        f"Original code of {filepath}, lines {start + 1}-{end}, each prefixed with its line number:\n"
+        f"```\n{numbered}\n```\n\n"
+        f"Apply the instructions only where they touch lines {start + 1}-{end}. "
+        "Output ONLY these lines with the edits applied, WITHOUT the line number prefixes. "
+        "Do not output any line outside this range. No explanations. no ``` at the start or end."
+    )
+    messages = [
+        {"role": "system", "content": EDITOR_PROMPT},
+        {"role": "user", "content": shared_message},
+        {"role": "user", "content": edit_message},
+    ]
+    response = client.chat.completions.create(
+        model=EDITOR_MODEL,
+        messages=build_messages(messages, EDITOR_MODEL, include_pinned=False),
+        extra_body={"usage": {"include": True}},
+    )
+    record_usage(response.usage)
+    return response.choices[0].message.content or ""
+
+async def edit_large_file(filepath, content, instructions, filepaths):
+    """Edit a large file by sending each affected chunk only its own instructions, concurrently."""
+    lines = content.split('\n')
+    chunks = split_into_chunks(lines)
+
+    file_plan = split_plan_by_file(instructions, filepaths)[filepath]
+    if not file_plan:
+        raise ValueError("the plan has no instructions for this file")
+
+    chunk_instructions = {}
+    chunk_refs = {}
+    for item in file_plan:
+        refs = instruction_line_refs(item)
+        if not refs:
+            raise ValueError(f"instruction has no line numbers: {item.strip()[:80]}")
+        targets = [(s, e) for s, e in chunks if any(s < ref <= e for ref in refs)]
+        if not targets:
+            raise ValueError(f"instruction refers to lines outside the file: {item.strip()[:80]}")
+        for chunk in targets:
+            chunk_instructions.setdefault(chunk, []).append(item)
+            chunk_refs.setdefault(chunk, set()).update(ref for ref in refs if chunk[0] < ref <= chunk[1])
+
+    print_colored(f"🧩 {filepath}: {len(lines)} lines in {len(chunks)} chunks, editing {len(chunk_instructions)} in parallel", Fore.CYAN)
+
+    targets = list(chunk_instructions)
+    results = await asyncio.gather(
+        *[asyncio.to_thread(edit_chunk, filepath, lines, s, e, '\n'.join(chunk_instructions[(s, e)]), '\n'.join(file_plan))
+          for s, e in targets],
+        return_exceptions=True,
+    )
+    edited_chunks = dict(zip(targets, results))
+
+    result_lines = []
+    problems = []
+    for s, e in chunks:
+        original = lines[s:e]
+        edited = edited_chunks.get((s, e))
+        if edited is None:
+            result_lines.extend(original)  # Untouched chunks pass through verbatim
+            continue
+        if isinstance(edited, Exception):
+            problems.append(f"lines {s + 1}-{e}: {edited}")
+            continue
+        prev_line = next((line for line in reversed(lines[:s]) if line.strip()), None)
+        next_line = next((line for line in lines[e:] if line.strip()), None)
+        fitted, problem = fit_chunk_edit(strip_code_fences(edited), original, prev_line, next_line, len(chunk_refs[(s, e)]))
+        if problem:
+            problems.append(f"lines {s + 1}-{e}: {problem}")
+            continue
+        result_lines.extend(fitted)
+        print_colored(f"✏️ Edited lines {s + 1}-{e}", Fore.CYAN)
+
+    # A partly applied plan (a rename done in one chunk but not the next) is worse than none
+    if problems:
+        raise ValueError("file left unchanged, chunk edits failed: " + "; ".join(problems))
+
+    return '\n'.join(result_lines)
+
+def save_edit_result(filepath, original, result):
+    undo_history[filepath] = original   # Store undo
+
+    if is_diff_on:
+        display_diff(original, result)  # Show final diff if it's on
+
+    # Write the changes to the file only after the entire editing process
+    if write_file_content(filepath, result):
+        print_colored(f"✅ {filepath} successfully edited and saved!", Fore.GREEN)
+    else:
+        print_colored(f"❌ Failed to save changes to {filepath}", Fore.RED)
+
+def choose_edit_route(filepaths, contents, user_request, flag=None):
+    """Pick "fast" (editor only) or "plan" (planner then editor) for an edit."""
+    if any(len(content.split('\n')) > LARGE_FILE_LINE_THRESHOLD for content in contents):
+        return "plan"  # Chunked editing needs a line-numbered plan
+    if flag:
+        return flag
+    if len(filepaths) > 1:
+        return "plan"
+    if len(contents[0].split('\n')) > FAST_EDIT_MAX_LINES:
+        return "plan"
+    request = user_request.lower()
+    if len(request.split()) > FAST_EDIT_MAX_WORDS or re.search(COMPLEX_EDIT_PATTERN, request):
+        return "plan"
+    return "fast"
+
+def recent_conversation(chat_history, turns=FAST_EDIT_CONTEXT_TURNS):
+    recent = [m for m in chat_history if m["role"] != "system"][-turns:]
+    return "\n\n".join(f"{m['role'].capitalize()}: {summarize_content(m['content'], limit=2000)}" for m in recent)
+
+def build_edit_message(filepath, content, instructions, conversation=None):
+    context = f"Recent conversation, for context:\n\n{conversation}\n\n" if conversation else ""
+    return context + f"""
+            Original code:
+
+            {content}
+
+            Instructions: {instructions}
+
+            Follow only instructions applicable to {filepath}. Output ONLY the new code. No explanations. DO NOT ADD ANYTHING ELSE. no type of file at the beginning of the file like ```python etq. no ``` at the end of the file.
+            """
+
+def build_edit_result(output, original):
+    """Turn the editor's complete output into the new file content."""
+    lines = strip_code_fences(output.strip('\n'))
+    if not any(line.strip() for line in lines):
+        raise ValueError("editor returned no code")
+    result = '\n'.join(lines)
+    if original.endswith('\n'):
+        result += '\n'
+    return result
+
+async def apply_file_edit(filepath, instructions, filepaths, editor_chat_history, conversation=None):
+    """Stream the editor's output for one file and save the result."""
+    current_content = read_file_content(filepath)  # Read fresh
+    if current_content.startswith("❌"):
+        print_colored(current_content, Fore.RED)
+        return False
+
+    if len(current_content.split('\n')) > LARGE_FILE_LINE_THRESHOLD:
+        result = await edit_large_file(filepath, current_content, instructions, filepaths)
+        editor_chat_history.append({"role": "user", "content": f"Chunked edit of {filepath}. Instructions: {instructions}"})
+        editor_chat_history.append({"role": "assistant", "content": f"Edited {filepath} in chunks."})
+        save_edit_result(filepath, current_content, result)
+        return True
+
+    editor_chat_history.append({"role": "user", "content": build_edit_message(filepath, current_content, instructions, conversation)})
+
+    original_line_count = len(current_content.split('\n'))
+    output = ""
+    buffer = ""
+    line_index = 0
+
+    for chunk in client.chat.completions.create(
+        model=EDITOR_MODEL,
+        # Without a planner in between, the editor needs the added files, searches and images itself
+        messages=build_messages(editor_chat_history, EDITOR_MODEL, include_pinned=conversation is not None),
+        stream=True,
+        extra_body={"usage": {"include": True}},
+    ):
+        if getattr(chunk, "usage", None):
+            record_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            content = chunk.choices[0].delta.content
+            print_colored(content, end="")
+            output += content
+            buffer += content
+
+            while '\n' in buffer:
+                line, buffer = buffer.split('\n', 1)
+                if line_index < original_line_count:
+                    print_colored(f"✏️ Updated Line {line_index+1}: {line[:50]}...", Fore.CYAN)
+                else:
+                    print_colored(f"➕ NEW Line {line_index+1}: {line[:50]}...", Fore.YELLOW)
+                line_index += 1
+
+    result = build_edit_result(output, current_content)
+    editor_chat_history.append({"role": "assistant", "content": result})
+    save_edit_result(filepath, current_content, result)
+    return True
+
+def request_file_edit(filepath, instructions, filepaths, editor_chat_history):
+    """Edit one file without streaming to the console, so it can run off the main thread."""
+    current_content = read_file_content(filepath)
+    if current_content.startswith("❌"):
+        raise IOError(current_content)
+
+    if len(current_content.split('\n')) > LARGE_FILE_LINE_THRESHOLD:
+        return current_content, asyncio.run(edit_large_file(filepath, current_content, instructions, filepaths))
+
+    messages = editor_chat_history + [{"role": "user", "content": build_edit_message(filepath, current_content, instructions)}]
+    response = client.chat.completions.create(
+        model=EDITOR_MODEL,
+        messages=build_messages(messages, EDITOR_MODEL, include_pinned=False),
+        extra_body={"usage": {"include": True}},
+    )
+    record_usage(response.usage)
+    return current_content, build_edit_result(response.choices[0].message.content or "", current_content)
+
+def plan_and_edit_pipelined(default_chat_history, editor_chat_history, filepaths, large_files):
+    """Stream the planner and start each file's editor as soon as the planner moves past it."""
+    # Room for a re-edit alongside each early edit, which can't be cancelled once running
+    executor = ThreadPoolExecutor(max_workers=len(filepaths) * 2)
+    editor_snapshot = list(editor_chat_history)
+    submitted = {}  # filepath -> (instructions given to the editor, future)
+    planned_lines = []
+    current_file = None
+    in_fence = False
+
+    def submit_edit(filepath, instructions):
+        submitted[filepath] = (instructions, executor.submit(request_file_edit, filepath, instructions, filepaths, editor_snapshot))
+
+    def on_line(line):
+        nonlocal current_file, in_fence
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+        # Only a heading moves the plan to another file; a passing mention in an instruction doesn't
+        heading_file = None if in_fence else plan_heading_file(line, filepaths)
+        if heading_file and heading_file != current_file:
+            # The planner moved on to another file, in whatever order it takes them.
+            # Large files wait for the final plan, whose line numbers are checked first.
+            if current_file is not None and current_file not in submitted and current_file not in large_files:
+                plan_so_far = '\n'.join(planned_lines)
+                if split_plan_by_file(plan_so_far, filepaths)[current_file]:
+                    submit_edit(current_file, plan_so_far)
+            current_file = heading_file
+        planned_lines.append(line)
+
+    default_instructions = get_streaming_response(default_chat_history, DEFAULT_MODEL, on_line=on_line)
+    default_chat_history.append({"role": "assistant", "content": default_instructions})
+    default_instructions = ensure_line_numbered_plan(default_chat_history, default_instructions, large_files, filepaths)
+    final_plan = split_plan_by_file(default_instructions, filepaths)
+
+    for fp in filepaths:
+        if fp not in submitted:
+            submit_edit(fp, default_instructions)
+        elif split_plan_by_file(submitted[fp][0], filepaths)[fp] != final_plan[fp]:
+            # The planner came back to this file after its editor started
+            print_colored(f"\n🔁 The plan for {fp} changed after its edit started, re-editing.", Fore.YELLOW)
+            submitted[fp][1].cancel()
+            submit_edit(fp, default_instructions)
+    print_colored("\n" + "=" * 50, Fore.MAGENTA)
+
+    for idx, filepath in enumerate(filepaths, 1):
+        print_colored(f"📝 EDITING {filepath} ({idx}/{len(filepaths)}):", Fore.BLUE)
+        instructions, future = submitted[filepath]
+        try:
+            current_content, result = future.result()
+        except Exception as e:
+            print_colored(f"❌ Error editing {filepath}: {e}", Fore.RED)
+            continue
+        editor_chat_history.append({"role": "user", "content": build_edit_message(filepath, current_content, instructions)})
+        editor_chat_history.append({"role": "assistant", "content": result})
+        save_edit_result(filepath, current_content, result)
+        print_colored("=" * 50, Fore.MAGENTA)
+
+    executor.shutdown()
+
 async def handle_edit_command(default_chat_history, editor_chat_history, filepaths):
+    route_flag = None
+    if "--fast" in filepaths:
+        route_flag = "fast"
+    elif "--plan" in filepaths:
+        route_flag = "plan"
+    filepaths = [fp for fp in filepaths if fp not in ("--fast", "--plan")]
+
     all_contents = [read_file_content(fp) for fp in filepaths]
     valid_files, valid_contents = [], []
 
@@ -321,79 +1064,61 @@ async def handle_edit_command(default_chat_history, editor_chat_history, filepat
         return default_chat_history, editor_chat_history
 
     user_request = await get_input_async(f"What would you like to change in {', '.join(valid_files)}?")
+    route = choose_edit_route(valid_files, valid_contents, user_request, route_flag)
+    flush_file_updates(default_chat_history)
 
-    instructions_prompt = "For these files:\n"
-    instructions_prompt += "\n".join([f"File: {fp}\n```\n{content}\n```\n" for fp, content in zip(valid_files, valid_contents)])
-    instructions_prompt += f"User wants: {user_request}\nProvide LINE-BY-LINE edit instructions for ALL files. Number each instruction and specify which file it applies to.\n"
-
-    default_chat_history.append({"role": "user", "content": instructions_prompt})
-    default_instructions = get_streaming_response(default_chat_history, DEFAULT_MODEL)
-    default_chat_history.append({"role": "assistant", "content": default_instructions})
+    if route == "fast":
+        print_colored(f"⚡ Sending the edit straight to {EDITOR_MODEL}", Fore.CYAN)
+        conversation = recent_conversation(default_chat_history)
+        default_chat_history.append({"role": "user", "content": f"Edit {', '.join(valid_files)}: {user_request}"})
 
-    print_colored("\n" + "=" * 50, Fore.MAGENTA)
+        outcomes = []
+        for idx, filepath in enumerate(valid_files, 1):
+            try:
+                print_colored(f"📝 EDITING {filepath} ({idx}/{len(valid_files)}):", Fore.BLUE)
+                if await apply_file_edit(filepath, user_request, valid_files, editor_chat_history, conversation):
+                    outcomes.append(f"Edited {filepath} directly.")
+                    print_colored("=" * 50, Fore.MAGENTA)
+                else:
+                    outcomes.append(f"Could not read {filepath}; it was not edited.")
+            except Exception as e:
+                outcomes.append(f"Failed to edit {filepath}: {e}")
+                print_colored(f"❌ Error editing {filepath}: {e}", Fore.RED)
 
-    for idx, (filepath, content) in enumerate(zip(valid_files, valid_contents), 1):
-        try:
-            print_colored(f"📝 EDITING {filepath} ({idx}/{len(valid_files)}):", Fore.BLUE)
+        default_chat_history.append({"role": "assistant", "content": " ".join(outcomes)})
+        return default_chat_history, editor_chat_history
 
-            edit_message = f"""
-            Original code:
+    instructions_prompt = "For these files:\n"
+    for fp, content in zip(valid_files, valid_contents):
+        lines = content.split('\n')
+        if len(lines) > LARGE_FILE_LINE_THRESHOLD:
+            # Number large files so instructions can reference the lines they touch
+            numbered = '\n'.join(f"{n}: {line}" for n, line in enumerate(lines, 1))
+            instructions_prompt += f"File: {fp} (large file, every instruction must give the original 'line N' or 'lines N-M' it changes)\n```\n{numbered}\n```\n\n"
+        else:
+            instructions_prompt += f"File: {fp}\n```\n{content}\n```\n\n"
+    instructions_prompt += f"User wants: {user_request}\nProvide LINE-BY-LINE edit instructions for ALL files. Number each instruction and group all instructions for a file together, under a heading naming that file.\n"
 
-            {content}
+    default_chat_history.append({"role": "user", "content": instructions_prompt})
+    large_files = [fp for fp, content in zip(valid_files, valid_contents) if len(content.split('\n')) > LARGE_FILE_LINE_THRESHOLD]
 
-            Instructions: {default_instructions}
+    if len(valid_files) > 1:
+        plan_and_edit_pipelined(default_chat_history, editor_chat_history, valid_files, large_files)
+        return default_chat_history, editor_chat_history
 
-            Follow only instructions applicable to {filepath}. Output ONLY the new code. No explanations. DO NOT ADD ANYTHING ELSE. no type of file at the beginning of the file like ```python etq. no ``` at the end of the file.
-            """
+    default_instructions = get_streaming_response(default_chat_history, DEFAULT_MODEL)
+    default_chat_history.append({"role": "assistant", "content": default_instructions})
+    default_instructions = ensure_line_numbered_plan(default_chat_history, default_instructions, large_files, valid_files)
 
-            editor_chat_history.append({"role": "user", "content": edit_message})
-
-            current_content = read_file_content(filepath)  # Read fresh
-            if current_content.startswith("❌"):
-                return default_chat_history, editor_chat_history
-
-            lines = current_content.split('\n')
-            buffer = ""
-            edited_lines = lines.copy()  # Create a copy to store edited lines
-            line_index = 0
-
-            for chunk in client.chat.completions.create(
-                model=EDITOR_MODEL,
-                messages=editor_chat_history,
-                stream=True,
-            ):
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    print_colored(content, end="")
-                    buffer += content
-
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        if line_index < len(edited_lines):
-                            edited_lines[line_index] = line
-                            print_colored(f"✏️ Updated Line {line_index+1}: {line[:50]}...", Fore.CYAN)
-                            line_index += 1
-                        else:
-                            edited_lines.append(line)
-                            print_colored(f"➕ NEW Line {line_index+1}: {line[:50]}...", Fore.YELLOW)
-                            line_index += 1
-
-            result = '\n'.join(edited_lines)
-            undo_history[filepath] = current_content   # Store undo
-            editor_chat_history.append({"role": "assistant", "content": result})
-
-            if is_diff_on:
-                display_diff(current_content, result)  # Show final diff if it's on
-
-            # Write the changes to the file only after the entire editing process
-            if write_file_content(filepath, result):
-                print_colored(f"✅ {filepath} successfully edited and saved!", Fore.GREEN)
-            else:
-                print_colored(f"❌ Failed to save changes to {filepath}", Fore.RED)
+    print_colored("\n" + "=" * 50, Fore.MAGENTA)
 
+    filepath = valid_files[0]
+    try:
+        print_colored(f"📝 EDITING {filepath} (1/1):", Fore.BLUE)
+        if await apply_file_edit(filepath, default_instructions, valid_files, editor_chat_history):
             print_colored("=" * 50, Fore.MAGENTA)
-        except Exception as e:
-            print_colored(f"❌ Error editing {filepath}: {e}", Fore.RED)
+    except Exception as e:
+        print_colored(f"❌ Error editing {filepath}: {e}", Fore.RED)
 
     return default_chat_history, editor_chat_history
 
@@ -431,6 +1156,11 @@ async def handle_clear_command():
     global added_files, stored_searches, stored_images
     cleared_something = False
 
+    clear_file_watches()
+    if pinned_context:
+        pinned_context.clear()
+        cleared_something = True
+
     if added_files:
         added_files.clear()
         cleared_something = True
@@ -458,6 +1188,8 @@ async def handle_reset_command(default_chat_history, editor_chat_history):
     added_files.clear()
     stored_searches.clear()
     stored_images.clear()
+    pinned_context.clear()
+    clear_file_watches()
 
     # Re-initialize:
     default_chat_history = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -479,18 +1211,34 @@ def toggle_diff():
         Fore.YELLOW,
     )
 
+def summarize_content(content, limit=100):
+    if isinstance(content, list):  # Multi-part messages, e.g. images
+        content = " ".join(part.get("text", "[image]") for part in content)
+    return content[:limit] + "..." if len(content) > limit else content
+
 def handle_history_command(chat_history):
+    if pinned_context:
+        print_colored("\n📌 Pinned Context:", Fore.BLUE)
+        for idx, message in enumerate(pinned_context, 1):
+            print_colored(f"{idx}. {summarize_content(message['content'])}", Fore.CYAN)
+
     print_colored("\n📜 Chat History:", Fore.BLUE)
     for idx, message in enumerate(chat_history[1:], 1):  # Skip system message
         role = message['role'].capitalize()
-        content = message['content'][:100] + "..." if len(message['content']) > 100 else message['content']
-        print_colored(f"{idx}. {role}: {content}", Fore.CYAN)
+        print_colored(f"{idx}. {role}: {summarize_content(message['content'])}", Fore.CYAN)
 
 async def handle_save_command(chat_history):
     filename = await get_input_async("Enter filename to save chat history:")
+    with watch_lock:
+        app_written_files.add(os.path.abspath(filename))
     try:
         with open(filename, 'w') as f:
-            json.dump(chat_history, f)
+            json.dump({
+                "chat_history": chat_history,
+                "pinned_context": pinned_context,
+                "added_files": added_files,
+                "indexed_dirs": sorted(indexed_dirs),
+            }, f)
         print_colored(f"✅ Chat history saved to {filename}", Fore.GREEN)
     except IOError as e:
         print_colored(f"❌ Error saving chat history: {e}", Fore.RED)
@@ -499,9 +1247,18 @@ async def handle_load_command():
     filename = await get_input_async("Enter filename to load chat history:")
     try:
         with open(filename, 'r') as f:
-            loaded_history = json.load(f)
+            loaded = json.load(f)
+        if isinstance(loaded, list):  # Saved before pinned context was stored alongside
+            loaded = {"chat_history": loaded}
+
+        # The loaded session's context replaces the current one
+        clear_file_watches()
+        pinned_context[:] = loaded.get("pinned_context", [])
+        added_files[:] = loaded.get("added_files", [])
+        restore_file_tracking(list(added_files), loaded.get("indexed_dirs", []))
+
         print_colored(f"✅ Chat history loaded from {filename}", Fore.GREEN)
-        return loaded_history
+        return loaded.get("chat_history")
     except IOError as e:
         print_colored(f"❌ Error loading chat history: {e}", Fore.RED)
         return None
@@ -536,7 +1293,7 @@ def print_welcome_message():
     table.add_column("Description")
 
     table.add_row("/add", "Add files to AI's knowledge base")
-    table.add_row("/edit", "Edit existing files")
+    table.add_row("/edit", "Edit existing files (--fast skips planning, --plan forces it)")
     table.add_row("/new", "Create new files")
     table.add_row("/search", "Perform a DuckDuckGo search")
     table.add_row("/image", "Add image(s) to AI's knowledge base")
@@ -551,6 +1308,7 @@ def print_welcome_message():
     table.add_row("/model", "Show current AI model")
     table.add_row("/change_model", "Change the AI model")
     table.add_row("/show", "Show content of a file")
+    table.add_row("/usage", "Show token usage and prompt cache hits for this session")
     table.add_row("exit", "Exit the application")
 
     console.print(table)
@@ -606,7 +1364,7 @@ async def handle_search_command(default_chat_history):
         search_content = f"Search results for '{search_query}':\n"
         for idx, result in enumerate(results[:8], 1):  # Limit to first 5 results for brevity
             search_content += f"{idx}. {result['title']}: {result['body'][:100]}...\n"
-        default_chat_history.append({"role": "user", "content": search_content})
+        pinned_context.append({"role": "user", "content": search_content})
 
     except Exception as e:
         print_colored(f"❌ Error performing search: {e}", Fore.RED)
@@ -616,6 +1374,25 @@ async def handle_search_command(default_chat_history):
 async def handle_help_command():
     print_welcome_message()
 
+def handle_usage_command():
+    console = Console()
+    table = Table(title="Session usage")
+
+    table.add_column("Metric", style="cyan", no_wrap=True)
+    table.add_column("Value", justify="right")
+
+    prompt_tokens = session_usage["prompt_tokens"]
+    cached_tokens = session_usage["cached_tokens"]
+    hit_rate = f"{cached_tokens / prompt_tokens:.0%}" if prompt_tokens else "-"
+
+    table.add_row("Requests", str(session_usage["requests"]))
+    table.add_row("Prompt tokens", str(prompt_tokens))
+    table.add_row("Cached prompt tokens", str(cached_tokens))
+    table.add_row("Cache hit rate", hit_rate)
+    table.add_row("Completion tokens", str(session_usage["completion_tokens"]))
+
+    console.print(table)
+
 def show_current_model():
     print_colored(f"Current model: {DEFAULT_MODEL}", Fore.CYAN)
 
@@ -725,6 +1502,10 @@ async def main():
                 await change_model()
                 continue
 
+            if prompt.startswith("/usage"):
+                handle_usage_command()
+                continue
+
             if prompt.startswith("/show "):
                 filepath = prompt.split("/show ", 1)[1].strip()
                 await show_file_content(filepath)
@@ -732,6 +1513,7 @@ async def main():
 
             print_colored("\n🤖 Assistant:", Fore.BLUE)
             try:
+                flush_file_updates(default_chat_history)
                 default_chat_history.append({"role": "user", "content": prompt})
                 response = get_streaming_response(default_chat_history, DEFAULT_MODEL)
                 default_chat_history.append({"role": "assistant", "content": response})